@@ -1,15 +1,23 @@
 # app.py — Streamlit Cloud–ready, safe version (Brevo SMTP)
 
 import os
+import hashlib
 import html
 import re
-from math import radians, sin, cos, asin, sqrt
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 
 import streamlit as st
-from fpdf import FPDF
 from groq import Groq
-import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from themes import CSS, FINDER_CARD_HTML, HEADER_HTML, MAIN_CARD_HTML, THEMES
 
 # -------------------- Page Config (must be first st.* call) -------------------- #
 st.set_page_config(page_title="HealthCare AI Assistant", page_icon="🩺", layout="wide")
@@ -34,88 +42,56 @@ def get_secret(name: str, required: bool = False, default: str | None = None) ->
         st.stop()
     return val
 
-# Not strictly required to render the app; features will be disabled if missing.
-GROQ_API_KEY = get_secret("GROQ_API_KEY", required=False)
-GEOAPIFY_KEY = get_secret("GEOAPIFY_KEY", required=False)
+# -------------------- App Config -------------------- #
+@dataclass(frozen=True)
+class Config:
+    groq_api_key: str | None
+    geoapify_key: str | None
+    smtp_host: str
+    smtp_port: int
+    smtp_login: str | None
+    smtp_password: str | None
+    from_email: str | None
+    from_name: str
+    reply_to_email: str | None
+    reply_to_name: str | None
+
+@st.cache_resource
+def app_config() -> Config:
+    """Resolves all secrets once per process instead of on every rerun."""
+    smtp_login = get_secret("BREVO_SMTP_LOGIN", required=False)  # e.g. 9388b3001@smtp-brevo.com
+    return Config(
+        # Not strictly required to render the app; features will be disabled if missing.
+        groq_api_key=get_secret("GROQ_API_KEY", required=False),
+        geoapify_key=get_secret("GEOAPIFY_KEY", required=False),
+        # Brevo SMTP
+        smtp_host=get_secret("BREVO_SMTP_HOST", required=False) or "smtp-relay.brevo.com",
+        smtp_port=int(get_secret("BREVO_SMTP_PORT", required=False) or 587),
+        smtp_login=smtp_login,
+        smtp_password=get_secret("BREVO_SMTP_PASSWORD", required=False),
+        # Optional: preferred From / Reply-To (use verified address if available)
+        from_email=get_secret("BREVO_FROM_EMAIL", required=False) or smtp_login,
+        from_name=get_secret("BREVO_FROM_NAME", required=False) or "HealthCare AI Assistant",
+        reply_to_email=get_secret("BREVO_REPLY_TO_EMAIL", required=False),
+        reply_to_name=get_secret("BREVO_REPLY_TO_NAME", required=False),
+    )
 
-# -------------------- Brevo SMTP Secrets -------------------- #
-BREVO_SMTP_HOST = get_secret("BREVO_SMTP_HOST", required=False) or "smtp-relay.brevo.com"
-BREVO_SMTP_PORT = int(get_secret("BREVO_SMTP_PORT", required=False) or 587)
-BREVO_SMTP_LOGIN = get_secret("BREVO_SMTP_LOGIN", required=False)  # e.g. 9388b3001@smtp-brevo.com
-BREVO_SMTP_PASSWORD = get_secret("BREVO_SMTP_PASSWORD", required=False)
+cfg = app_config()
 
-# Optional: preferred From / Reply-To (use verified address if available)
-BREVO_FROM_EMAIL = get_secret("BREVO_FROM_EMAIL", required=False) or BREVO_SMTP_LOGIN
-BREVO_FROM_NAME = get_secret("BREVO_FROM_NAME", required=False) or "HealthCare AI Assistant"
-BREVO_REPLY_TO_EMAIL = get_secret("BREVO_REPLY_TO_EMAIL", required=False)
-BREVO_REPLY_TO_NAME = get_secret("BREVO_REPLY_TO_NAME", required=False)
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
 
 # -------------------- Theme State -------------------- #
 if "theme" not in st.session_state:
     st.session_state.theme = "dark"
 
 theme = st.session_state.theme
-if theme == "dark":
-    bg_color = "#121212"
-    text_color = "#FFFFFF"
-    header_color = "#5B0C86"
-    card_color = "#1e1e26"
-    result_color = "#2A2A2D"
-    button_color = "#ffffff"
-    button_text = "#6a1b9a"
-    shadow = "0 4px 6px rgba(0, 0, 0, 0.1)"
-else:
-    bg_color = "#f5f5f5"
-    text_color = "#000000"
-    header_color = "#e1bee7"
-    result_color = "#f7eeee"
-    card_color = "#ffffff"
-    button_color = "#ce93d8"
-    button_text = "#000000"
-    shadow = "0 4px 6px rgba(0, 0, 0, 0.1)"
+text_color = THEMES[theme]["text_color"]
 
 # -------------------- Safe CSS -------------------- #
-st.markdown(f"""
-    <style>
-        html, body, [data-testid="stAppViewContainer"], .main, .block-container {{
-            background-color: {bg_color} !important;
-            color: {text_color} !important;
-        }}
-        .block-container {{ padding-top: 6rem !important; }}
-        #MainMenu, footer, header {{ visibility: hidden; }}
-        .custom-header {{
-            position: fixed; top: 0; left: 0; right: 0; height: 60px;
-            background-color: {header_color}; color: {text_color};
-            padding: 0 2rem; z-index: 9999;
-            display: flex; align-items: center; justify-content: space-between;
-        }}
-        .custom-header-title {{ font-size: 1.4rem; font-weight: bold; }}
-        .stButton>button, .stDownloadButton>button {{
-            background-color: {button_color} !important;
-            color: {button_text} !important;
-            font-weight: bold; border: none; padding: 8px 16px;
-            border-radius: 6px; box-shadow: {shadow};
-            transition: all 0.3s ease-in-out;
-        }}
-        .stButton>button:hover, .stDownloadButton>button:hover {{
-            transform: scale(1.05);
-            box-shadow: 0 6px 12px rgba(0, 0, 0, 0.25);
-        }}
-        .result-container {{
-            background-color: {result_color};
-            padding: 15px; border-radius: 10px; margin-top: 10px;
-            box-shadow: 0px 4px 16px rgba(0, 0, 0, 0.2);
-            word-wrap: break-word; white-space: pre-wrap;
-        }}
-    </style>
-""", unsafe_allow_html=True)
+st.markdown(CSS[theme], unsafe_allow_html=True)
 
 # -------------------- Header + Theme toggle -------------------- #
-st.markdown("""
-    <div class="custom-header">
-        <div class="custom-header-title">🩺 HealthCare AI Assistant</div>
-    </div>
-""", unsafe_allow_html=True)
+st.markdown(HEADER_HTML, unsafe_allow_html=True)
 
 col1, col2, col3 = st.columns([6, 1, 1])
 with col3:
@@ -125,61 +101,493 @@ with col3:
         st.rerun()
 
 # -------------------- Optional Images -------------------- #
-def get_base64_image(path: str) -> str | None:
+@st.cache_resource
+def asset_path(path: str) -> str | None:
+    """Returns path if the file can be opened (checked once per process)."""
     try:
-        if os.path.exists(path):
-            import base64
-            with open(path, "rb") as f:
-                return base64.b64encode(f.read()).decode()
-    except Exception:
-        pass
-    return None
+        with open(path, "rb"):
+            return path
+    except OSError:
+        return None
 
-gif_base64 = get_base64_image("Online Doctor.gif")
-if gif_base64:
-    st.markdown(f"""
-        <div style="text-align:center; margin-top:20px;">
-            <img src="data:image/gif;base64,{gif_base64}" style="max-width:280px;"/>
-        </div>
-    """, unsafe_allow_html=True)
+# Served by Streamlit's media endpoint, so the browser can cache the GIF instead
+# of receiving it base64-inlined in every rerun's HTML. Streamlit itself still
+# reads and inspects the file on each rerun; only the browser-side cost is gone.
+doctor_gif = asset_path("Online Doctor.gif")
+if doctor_gif:
+    _, gif_col, _ = st.columns([2, 1, 2])
+    with gif_col:
+        st.image(doctor_gif)  # natural 150 px size, as the old max-width:280px cap gave
 
 # -------------------- Groq Client -------------------- #
+@st.cache_resource
+def get_groq_client(api_key: str) -> Groq:
+    """One client per process so its HTTP connection pool survives reruns."""
+    return Groq(api_key=api_key)
+
 client = None
-if GROQ_API_KEY:
+if cfg.groq_api_key:
     try:
-        client = Groq(api_key=GROQ_API_KEY)
+        client = get_groq_client(cfg.groq_api_key)
     except Exception as e:
         st.warning(f"LLM not available: {e}")
 
-def ask_groq(user_input: str) -> str:
-    if not client:
-        return "LLM is not configured. Please add GROQ_API_KEY in Streamlit secrets."
+LLM_MODEL = "llama3-70b-8192"
+LLM_TEMPERATURE = 0.2
+ANSWER_TTL_S = 3600
+ANSWER_MAX_ENTRIES = 256
+
+# Static instructions go first and must stay byte-identical between calls
+# (no timestamps or per-user values) so provider-side prompt caching can reuse
+# the prefix; the user's symptoms are always sent last.
+SYSTEM_PROMPT = """You are HealthCare AI Assistant, a careful and friendly health information assistant.
+People describe symptoms or health concerns in their own words, and you help them understand
+what might be going on and what to do next. You are not a doctor, you cannot examine the person,
+and nothing you write is a diagnosis. Your job is to give clear, balanced, general information and
+to point people to the right level of care.
+
+GENERAL PRINCIPLES
+- Be calm, respectful and non-judgmental. Use plain language; explain any medical term you use.
+- Never claim certainty. Use phrases such as "could be", "is often caused by", "is less likely".
+- Do not prescribe prescription-only medicines, doses for children, or changes to existing
+  prescriptions. You may mention common over-the-counter options in general terms and remind the
+  person to follow the label and ask a pharmacist if they take other medicines, are pregnant or
+  breastfeeding, or have kidney, liver or heart disease.
+- Do not invent facts, statistics, studies or sources. If the description is too vague to say
+  anything useful, say so and list the details that would help (age, duration, severity,
+  temperature, medicines, existing conditions, recent travel, pregnancy).
+- Respect privacy: do not ask for names, addresses or identification numbers.
+- If the message is not about health, politely say that you can only help with health questions.
+- Answer in the same language the person used.
+
+TRIAGE RUBRIC
+Decide which of the following levels best fits the description and let it shape the whole answer.
+1. EMERGENCY - tell the person to call local emergency services or go to the nearest emergency
+   department now. Examples: chest pain or pressure, especially with sweating, nausea or pain
+   spreading to the arm, jaw or back; difficulty breathing or blue lips; signs of stroke (face
+   drooping, arm weakness, speech difficulty, sudden confusion or vision loss); severe bleeding;
+   fainting or unresponsiveness; seizure lasting more than five minutes; severe allergic reaction
+   with swelling of the face or throat; sudden worst-ever headache; stiff neck with fever and rash;
+   severe abdominal pain with a rigid abdomen; vomiting blood or black stools; major trauma; thoughts
+   of self-harm or suicide; suspected poisoning or overdose; a baby under three months with fever.
+2. URGENT - the person should be seen by a doctor the same day or within 24 hours. Examples: high
+   fever above 39.5 C (103 F) or fever lasting more than three days; dehydration (very little urine,
+   dizziness, dry mouth); painful urination with fever or back pain; worsening pain; a wound that is
+   red, hot, swollen or draining pus; symptoms in someone who is pregnant, elderly, or has diabetes,
+   heart or lung disease, cancer or a weakened immune system.
+3. ROUTINE - book a regular appointment within days to weeks. Examples: symptoms lasting more than
+   two weeks, recurring problems, slowly changing skin lesions, unexplained weight change, ongoing
+   tiredness, mild but persistent pain.
+4. SELF-CARE - most likely minor and expected to settle with home care. Examples: a common cold,
+   mild sore throat without fever, minor muscle strain, mild indigestion. Still explain what would
+   change this and when to seek care.
+When in doubt between two levels, choose the more cautious one. For EMERGENCY situations, put the
+instruction to seek immediate help in the very first sentence of the summary.
+
+MENTAL HEALTH
+If the person mentions hopelessness, self-harm or suicide, respond with empathy, encourage them to
+contact local emergency services or a crisis line right away, and suggest reaching out to someone
+they trust. Keep the rest of the answer short.
+
+CHILDREN, PREGNANCY AND OLDER ADULTS
+Infants, young children, pregnant people and older adults can become unwell faster. Lower your
+threshold for recommending medical review and say so explicitly.
+
+OUTPUT FORMAT
+Reply in Markdown using exactly these five sections, in this order, each introduced by a level-two
+heading written exactly as shown. Do not add other headings, tables, code blocks or links.
+
+## Summary
+Two to four sentences restating the main concern and the triage level (Emergency, Urgent, Routine
+or Self-care) with a short reason.
+
+## Possible conditions
+A bulleted list of up to five possible explanations, most likely first, each with one short line on
+why it fits and one feature that would make it more or less likely.
+
+## Red flags
+A bulleted list of warning signs that would mean the person needs urgent or emergency care.
+
+## Self-care
+A bulleted list of practical, safe steps the person can take now, such as rest, fluids, and
+general over-the-counter options where appropriate.
+
+## When to see a doctor
+One or two sentences on how soon to seek care and which kind of clinician is appropriate.
+
+Finish with a single line reminding the person that this is general information and not a medical
+diagnosis. Keep the full answer under 450 words."""
+
+SYSTEM_PROMPT_ID = hashlib.sha1(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+# Section headings requested in SYSTEM_PROMPT, in order: (key, heading)
+REPORT_SECTIONS = [
+    ("summary", "Summary"),
+    ("possible_conditions", "Possible conditions"),
+    ("red_flags", "Red flags"),
+    ("self_care", "Self-care"),
+    ("when_to_see_doctor", "When to see a doctor"),
+]
+_HEADING_RE = re.compile(r"^#{1,6}\s*(.+?)\s*#*\s*$", re.MULTILINE)
+
+def _heading_key(title: str) -> str:
+    # "Self-care", "self care", "**Red Flags:**" all compare equal
+    return re.sub(r"[\s\-]+", " ", title.strip("*: ").lower())
+
+_HEADING_KEYS = {_heading_key(title): key for key, title in REPORT_SECTIONS}
+
+def parse_report_sections(text: str) -> dict[str, str]:
+    """
+    Splits an answer written in the SYSTEM_PROMPT format into its sections,
+    so the one streamed completion also feeds the structured PDF report.
+    Text before the first heading is kept at the top of the summary.
+    Returns {} (callers then show the raw answer) if the model ignored the
+    format, so no part of the answer is ever dropped.
+    """
+    matches = list(_HEADING_RE.finditer(text))
+    keys = [_HEADING_KEYS.get(_heading_key(m.group(1))) for m in matches]
+    if not matches or None in keys or len(set(keys)) != len(keys):
+        return {}
+    sections: dict[str, str] = {}
+    for i, (m, key) in enumerate(zip(matches, keys)):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        body = text[m.end():end].replace("**", "").strip()
+        if body:
+            sections[key] = body
+    lead = text[:matches[0].start()].replace("**", "").strip()
+    if lead:
+        sections["summary"] = "\n\n".join(filter(None, [lead, sections.get("summary")]))
+    return sections
+
+def llm_messages(user_input: str) -> list[dict]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_input},
+    ]
+
+def prompt_cache_key(user_input: str) -> str:
+    """Case/whitespace-insensitive key; model, temperature and system prompt are part of it."""
+    norm = re.sub(r"\s+", " ", user_input.strip().lower())
+    return f"{LLM_MODEL}|{LLM_TEMPERATURE}|{SYSTEM_PROMPT_ID}|{norm}"
+
+@st.cache_resource
+def answer_cache() -> tuple[OrderedDict, threading.Lock]:
+    # key -> (stored_at, answer); LRU order, shared across sessions
+    return OrderedDict(), threading.Lock()
+
+def get_cached_answer(key: str) -> str | None:
+    cache, lock = answer_cache()
+    with lock:
+        hit = cache.get(key)
+        if hit is None:
+            return None
+        if time.monotonic() - hit[0] > ANSWER_TTL_S:
+            del cache[key]
+            return None
+        cache.move_to_end(key)
+        return hit[1]
+
+def store_answer(key: str, answer: str):
+    cache, lock = answer_cache()
+    with lock:
+        cache[key] = (time.monotonic(), answer)
+        cache.move_to_end(key)
+        while len(cache) > ANSWER_MAX_ENTRIES:
+            cache.popitem(last=False)
+
+class InflightAnswer:
+    """A completion running on a worker thread; any number of readers can follow its chunks."""
+
+    def __init__(self):
+        self.parts: list[str] = []
+        self.done = False
+        self.cond = threading.Condition()
+
+    def append(self, piece: str):
+        with self.cond:
+            self.parts.append(piece)
+            self.cond.notify_all()
+
+    def finish(self):
+        with self.cond:
+            self.done = True
+            self.cond.notify_all()
+
+    def follow(self):
+        """Yields every chunk from the start, then new ones as they arrive."""
+        i = 0
+        while True:
+            with self.cond:
+                while i >= len(self.parts) and not self.done:
+                    self.cond.wait()
+                new, finished = self.parts[i:], self.done
+                i += len(new)
+            yield from new
+            if finished:
+                return
+
+@st.cache_resource
+def inflight_answers() -> tuple[dict[str, InflightAnswer], threading.Lock]:
+    return {}, threading.Lock()
+
+def _run_completion(llm, key: str, user_input: str, inflight: InflightAnswer):
+    ok = False
     try:
-        resp = client.chat.completions.create(
-            model="llama3-70b-8192",
-            messages=[{"role": "user", "content": user_input}],
-            temperature=0.2,
+        resp = llm.chat.completions.create(
+            model=LLM_MODEL,
+            messages=llm_messages(user_input),
+            temperature=LLM_TEMPERATURE,
             max_tokens=800,
+            stream=True,
         )
-        return (resp.choices[0].message.content or "").strip()
+        for chunk in resp:
+            inflight.append(chunk.choices[0].delta.content or "")
+        ok = True
     except Exception as e:
-        return f"LLM error: {e}"
+        inflight.append(f"LLM error: {e}")
+    finally:
+        if ok:
+            store_answer(key, "".join(inflight.parts).strip())
+        registry, lock = inflight_answers()
+        with lock:
+            registry.pop(key, None)
+        inflight.finish()
+
+def ask_groq_stream(user_input: str):
+    """
+    Yields the LLM answer chunk by chunk (for st.write_stream); repeat prompts come from cache.
+    The completion runs on its own thread, so a double-click or quick rerun with the same
+    prompt joins the request already in flight instead of starting another one.
+    """
+    key = prompt_cache_key(user_input)
+    cached = get_cached_answer(key)
+    if cached is not None:
+        yield cached
+        return
+    if not client:
+        yield "LLM is not configured. Please add GROQ_API_KEY in Streamlit secrets."
+        return
+    registry, lock = inflight_answers()
+    with lock:
+        inflight = registry.get(key)
+        if inflight is None:
+            inflight = registry[key] = InflightAnswer()
+            # One thread per distinct prompt, so sessions never queue behind each other
+            threading.Thread(target=_run_completion, args=(client, key, user_input, inflight),
+                             name="groq-completion", daemon=True).start()
+    yield from inflight.follow()
 
 # -------------------- Unicode PDF -------------------- #
-class PDF(FPDF):
-    def __init__(self):
-        super().__init__()
-        self.add_page()
-        # Make sure DejaVuSans.ttf is in repo root
-        self.add_font("FreeSerif", "", "FreeSerif.ttf", uni=True)
-        self.set_font("FreeSerif", size=12)
+# fpdf2 is imported on first use so page loads that never build a PDF skip it.
+@st.cache_resource
+def pdf_class():
+    from fpdf import FPDF
+
+    class PDF(FPDF):
+        def __init__(self):
+            super().__init__()
+            self.add_page()
+            # Make sure DejaVuSans.ttf is in repo root
+            self.add_font("FreeSerif", "", "FreeSerif.ttf", uni=True)
+            self.set_font("FreeSerif", size=12)
+            self.set_compression(True)
+
+        def add_unicode_text(self, text: str):
+            # NFC folds decomposed accents into single glyphs before fpdf2's per-char lookup
+            text = unicodedata.normalize("NFC", text)
+            for i, para in enumerate(re.split(r"\n\s*\n", text.strip())):
+                if i:
+                    self.ln(8)  # the blank line between paragraphs
+                self.multi_cell(0, 8, para, new_x="LMARGIN", new_y="NEXT")
+
+        def add_section(self, title: str, text: str):
+            self.set_font_size(15)
+            self.multi_cell(0, 10, title, new_x="LMARGIN", new_y="NEXT")
+            self.set_font_size(12)
+            self.add_unicode_text(text)
+            self.ln(4)
+
+    return PDF
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def render_pdf(text: str) -> bytes:
+    """Renders the report once per distinct text, skipping the TTF parse on repeat clicks."""
+    pdf = pdf_class()()
+    sections = parse_report_sections(text)
+    if sections:
+        for key, title in REPORT_SECTIONS:
+            if key in sections:
+                pdf.add_section(title, sections[key])
+    else:
+        pdf.add_unicode_text(text)
+    return bytes(pdf.output())
+
+# -------------------- Brevo SMTP Connection -------------------- #
+@st.cache_resource
+def smtp_connection(host: str, port: int, login: str, password: str):
+    """Authenticated SMTP session kept open between sends (STARTTLS on 587)."""
+    import smtplib
+    server = smtplib.SMTP(host, port, timeout=30)
+    try:
+        server.ehlo()
+        server.starttls()
+        server.ehlo()
+        server.login(login, password)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+@st.cache_resource
+def smtp_lock() -> threading.Lock:
+    # The cached connection is shared by all sessions; serialize its use.
+    return threading.Lock()
+
+def smtp_send(from_addr: str, to_addr: str, message):
+    import smtplib
+    args = (cfg.smtp_host, cfg.smtp_port, cfg.smtp_login, cfg.smtp_password)
+    with smtp_lock():
+        # Connect/login errors (e.g. bad credentials) propagate: retrying can't help.
+        server = smtp_connection(*args)
+        try:
+            if server.noop()[0] != 250:
+                raise smtplib.SMTPServerDisconnected("stale connection")
+        except (smtplib.SMTPException, OSError):
+            # Server closed the idle connection: release its socket and reconnect once.
+            try:
+                server.close()
+            except Exception:
+                pass
+            smtp_connection.clear()
+            server = smtp_connection(*args)
+        server.send_message(message, from_addr, to_addr)
+
+# -------------------- Geoapify Helpers -------------------- #
+@st.cache_resource
+def geoapify_session() -> requests.Session:
+    """Shared keep-alive session so Geoapify calls skip the TCP/TLS handshake."""
+    s = requests.Session()
+    retry = Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+    s.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=retry))
+    return s
+
+@st.cache_data(ttl=3600)
+def geocode_candidates(address: str, api_key: str, limit: int = 3) -> list[tuple[float, float, str, float]]:
+    """Up to `limit` (lat, lon, formatted, confidence) matches for an address, best match first."""
+    try:
+        r = geoapify_session().get(
+            "https://api.geoapify.com/v1/geocode/search",
+            params={"text": address, "limit": limit, "apiKey": api_key},
+            timeout=20
+        )
+        if r.ok:
+            return [
+                (p["lat"], p["lon"], p.get("formatted") or address,
+                 float((p.get("rank") or {}).get("confidence") or 0.0))
+                for p in (f.get("properties", {}) for f in r.json().get("features", []))
+                if p.get("lat") is not None and p.get("lon") is not None
+            ]
+    except Exception:
+        pass
+    return []
 
-    def add_unicode_text(self, text: str):
-        self.multi_cell(0, 8, text)
+# The results table shows every hospital returned and the driving-distance
+# slider can route all of them, so the places query asks for exactly that many.
+HOSPITAL_RESULT_LIMIT = 10
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def find_nearby_hospitals(lat: float, lon: float, api_key: str):
+    try:
+        r = geoapify_session().get(
+            "https://api.geoapify.com/v2/places",
+            params={
+                "categories": "healthcare.hospital",
+                "conditions": "named",
+                "filter": f"circle:{lon},{lat},35000",  # lon,lat
+                "bias": f"proximity:{lon},{lat}",
+                "limit": HOSPITAL_RESULT_LIMIT,
+                "apiKey": api_key,
+            },
+            timeout=20
+        )
+        if not r.ok:
+            return None
+        # Keep only the fields the UI renders, so the cached entry stays small
+        return {"features": [
+            {"properties": {k: f.get("properties", {}).get(k) for k in ("name", "formatted", "lat", "lon")}}
+            for f in r.json().get("features", [])
+        ]}
+    except Exception:
+        return None
+
+# show_spinner=False: this is called from worker threads (no script context)
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_route_distance_km(start_lat, start_lon, end_lat, end_lon, api_key: str):
+    """Driving distance in km using Geoapify routing (NOTE: waypoints are lon,lat)."""
+    try:
+        r = geoapify_session().get(
+            "https://api.geoapify.com/v1/routing",
+            params={
+                "waypoints": f"{start_lon},{start_lat}|{end_lon},{end_lat}",
+                "mode": "drive",
+                "details": "route_details",
+                "apiKey": api_key,
+            },
+            timeout=20
+        )
+        if r.ok:
+            data = r.json()
+            if data.get("features"):
+                return data["features"][0]["properties"]["distance"] / 1000
+    except Exception:
+        pass
+    return None
+
+# Below this geocoder confidence the best match is treated as a guess, and the
+# places lookups for all candidates are issued together up front.
+AMBIGUOUS_CONFIDENCE = 0.5
+
+def search_hospitals(address: str, api_key: str):
+    """
+    Geocodes the address and returns (lat, lon, hospitals, place, fallback_from)
+    for the best match that has results. `place` is the geocoded name of the
+    location used; `fallback_from` names the best match when it had no hospitals
+    and a lower-ranked candidate was used instead (otherwise None).
+    A confident best match costs one places call; the other candidates are only
+    queried (concurrently) if it comes back empty, or up front if it is ambiguous.
+    """
+    candidates = geocode_candidates(address, api_key)
+    if not candidates:
+        return None, None, None, None, None
+
+    def lookup(c):
+        # ~100 m grid, so nearby lookups of the same place share one cache entry
+        return find_nearby_hospitals(round(c[0], 3), round(c[1], 3), api_key)
+
+    def lookup_all(cands):
+        if len(cands) <= 1:
+            return [lookup(c) for c in cands]
+        with ThreadPoolExecutor(max_workers=len(cands)) as ex:
+            return list(ex.map(lookup, cands))
+
+    def has_results(hospitals):
+        return bool(hospitals and hospitals.get("features"))
+
+    if candidates[0][3] < AMBIGUOUS_CONFIDENCE:
+        results = lookup_all(candidates)
+    else:
+        results = [lookup(candidates[0])]
+        if not has_results(results[0]):
+            results += lookup_all(candidates[1:])
+    best_place = candidates[0][2]
+    for i, ((lat, lon, place, _), hospitals) in enumerate(zip(candidates, results)):
+        if has_results(hospitals):
+            return lat, lon, hospitals, place, (best_place if i else None)
+    lat, lon, place, _ = candidates[0]
+    return lat, lon, None, place, None
 
 # -------------------- Main Card -------------------- #
-st.markdown(f"<div style='background-color:{card_color}; color:{text_color}; padding:2rem; border-radius:20px;'>",
-            unsafe_allow_html=True)
+st.markdown(MAIN_CARD_HTML[theme], unsafe_allow_html=True)
 
 st.subheader("Enter Symptoms or Health Concern")
 st.caption("**Disclaimer:** This tool provides general information and is **not** a medical diagnosis. "
@@ -195,48 +603,51 @@ if st.button("Analyze Symptoms"):
     if not symptoms.strip():
         st.warning("⚠️ Please describe your symptoms.")
     else:
-        with st.spinner("Analyzing symptoms..."):
-            llm_response = ask_groq(symptoms.strip())
-        st.session_state.llm_response = llm_response
-        st.session_state.pdf_generated = False
+        # Stream tokens as they arrive; the placeholder is cleared afterwards
+        # because the full answer is rendered below from session_state.
+        stream_box = st.empty()
+        with stream_box.container():
+            llm_response = st.write_stream(ask_groq_stream(symptoms.strip()))
+        stream_box.empty()
+        if not isinstance(llm_response, str):
+            llm_response = "".join(str(part) for part in llm_response)
+        st.session_state.llm_response = llm_response.strip()
+        st.session_state.pop("pdf_bytes", None)  # report belongs to the previous analysis
         st.success("✅ Analysis complete!")
 
 # Render AI response (escaped to avoid HTML injection)
 if "llm_response" in st.session_state:
-    escaped = html.escape(st.session_state.llm_response or "")
+    sections = parse_report_sections(st.session_state.llm_response or "")
+    if sections:
+        body = "".join(
+            f"<p><strong>{html.escape(title)}</strong></p><div>{html.escape(sections[key])}</div>"
+            for key, title in REPORT_SECTIONS if key in sections
+        )
+    else:
+        body = f"<div>{html.escape(st.session_state.llm_response or '')}</div>"
     st.markdown(
-        f'<div class="result-container"><p><strong>AI Response:</strong></p><div>{escaped}</div></div>',
+        f'<div class="result-container"><p><strong>AI Response:</strong></p>{body}</div>',
         unsafe_allow_html=True
     )
 
     if st.button("📝 Generate PDF"):
         try:
-            pdf = PDF()
-            pdf.add_unicode_text(st.session_state.llm_response or "")
-            pdf_path = "healthcare_report.pdf"
-            pdf.output(pdf_path)
-            st.session_state.pdf_generated = True
-            st.session_state.pdf_path = pdf_path
+            st.session_state.pdf_bytes = render_pdf(st.session_state.llm_response or "")
             st.success("✅ PDF generated successfully!")
         except Exception as e:
             st.error(f"❌ Failed to generate PDF: {e}")
 
-if st.session_state.get("pdf_generated", False):
-    try:
-        with open(st.session_state.pdf_path, "rb") as f:
-            st.download_button("⬇️ Download PDF", f, file_name="healthcare_report.pdf", mime="application/pdf")
-    except Exception as e:
-        st.error(f"Could not open generated PDF: {e}")
+if "pdf_bytes" in st.session_state:
+    st.download_button("⬇️ Download PDF", data=st.session_state["pdf_bytes"],
+                       file_name="healthcare_report.pdf", mime="application/pdf")
 
     # -------------------- Email sending (optional) — Brevo SMTP -------------------- #
     st.markdown("---")
     st.subheader("📧 Send the PDF to your email")
     email = st.text_input("Recipient email", placeholder="you@example.com")
 
-    EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
-
     # Check SMTP config presence
-    can_send_email = bool(BREVO_SMTP_HOST and BREVO_SMTP_PORT and BREVO_SMTP_LOGIN and BREVO_SMTP_PASSWORD)
+    can_send_email = bool(cfg.smtp_host and cfg.smtp_port and cfg.smtp_login and cfg.smtp_password)
     if not can_send_email:
         st.info("Email sending is not configured. Add **BREVO_SMTP_HOST**, **BREVO_SMTP_PORT**, "
                 "**BREVO_SMTP_LOGIN**, and **BREVO_SMTP_PASSWORD** to Secrets to enable.")
@@ -248,59 +659,44 @@ if st.session_state.get("pdf_generated", False):
             st.error("Email sending not configured. Set Brevo SMTP secrets first.")
         else:
             try:
-                with open(st.session_state.pdf_path, 'rb') as f:
-                    pdf_binary_data = f.read()
+                pdf_binary_data = st.session_state["pdf_bytes"]
 
                 # Build MIME email
-                from email.mime.multipart import MIMEMultipart
-                from email.mime.text import MIMEText
-                from email.mime.base import MIMEBase
-                from email import encoders
-                import smtplib
-
-                msg = MIMEMultipart()
-                msg['From'] = f"{BREVO_FROM_NAME} <{BREVO_FROM_EMAIL}>"
+                from email.message import EmailMessage
+
+                msg = EmailMessage()
+                msg['From'] = f"{cfg.from_name} <{cfg.from_email}>"
                 msg['To'] = email.strip()
                 msg['Subject'] = "Your Healthcare Report"
 
                 # Optional Reply-To header
-                if BREVO_REPLY_TO_EMAIL:
-                    if BREVO_REPLY_TO_NAME:
-                        msg.add_header('Reply-To', f"{BREVO_REPLY_TO_NAME} <{BREVO_REPLY_TO_EMAIL}>")
+                if cfg.reply_to_email:
+                    if cfg.reply_to_name:
+                        msg.add_header('Reply-To', f"{cfg.reply_to_name} <{cfg.reply_to_email}>")
                     else:
-                        msg.add_header('Reply-To', BREVO_REPLY_TO_EMAIL)
-
-                msg.attach(MIMEText("Attached is your AI-generated healthcare report.", 'plain'))
+                        msg.add_header('Reply-To', cfg.reply_to_email)
 
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(pdf_binary_data)
-                encoders.encode_base64(part)
-                part.add_header('Content-Disposition', 'attachment; filename=healthcare_report.pdf')
-                msg.attach(part)
+                msg.set_content("Attached is your AI-generated healthcare report.")
+                msg.add_attachment(pdf_binary_data, maintype='application', subtype='pdf',
+                                   filename='healthcare_report.pdf')
 
-                # Send via Brevo SMTP (TLS on 587)
-                with smtplib.SMTP(BREVO_SMTP_HOST, BREVO_SMTP_PORT, timeout=30) as server:
-                    server.ehlo()
-                    server.starttls()
-                    server.ehlo()
-                    server.login(BREVO_SMTP_LOGIN, BREVO_SMTP_PASSWORD)
-                    server.sendmail(BREVO_FROM_EMAIL or BREVO_SMTP_LOGIN, email.strip(), msg.as_string())
+                # Send via Brevo SMTP (reuses the cached connection)
+                smtp_send(cfg.from_email or cfg.smtp_login, email.strip(), msg)
 
                 st.success(f"✅ PDF sent to {email.strip()} successfully!")
-            except FileNotFoundError:
-                st.error("❌ PDF file not found. Please generate the PDF first.")
+            except KeyError:
+                st.error("❌ PDF not found. Please generate the PDF first.")
             except Exception as e:
                 st.error(f"❌ Failed to send email: {e}")
 
 st.markdown("</div>", unsafe_allow_html=True)
 
 # -------------------- Hospital Finder -------------------- #
-st.markdown(f"<div style='background-color:{card_color}; color:{text_color}; padding:1.5rem; border-radius:15px; margin-top:30px;'>",
-            unsafe_allow_html=True)
+st.markdown(FINDER_CARD_HTML[theme], unsafe_allow_html=True)
 
 st.subheader("🏥 Find Nearby Hospitals")
 
-if not GEOAPIFY_KEY:
+if not cfg.geoapify_key:
     st.info("Hospital search is disabled. Add **GEOAPIFY_KEY** to Secrets to enable.")
 else:
     col_h1, col_h2 = st.columns([3, 1])
@@ -311,115 +707,69 @@ else:
         search_clicked = st.button("🔍 Search Hospitals")
         st.markdown("</div>", unsafe_allow_html=True)
 
-    # Cached helpers
-    @st.cache_data(ttl=3600)
-    def geocode_address(address: str, api_key: str):
-        try:
-            r = requests.get(
-                "https://api.geoapify.com/v1/geocode/search",
-                params={"text": address, "apiKey": api_key},
-                timeout=20
-            )
-            if r.ok:
-                data = r.json()
-                if data.get("features"):
-                    p = data["features"][0]["properties"]
-                    return p.get("lat"), p.get("lon")
-        except Exception:
-            return None, None
-        return None, None
-
-    @st.cache_data(ttl=3600)
-    def find_nearby_hospitals(lat: float, lon: float, api_key: str):
-        try:
-            r = requests.get(
-                "https://api.geoapify.com/v2/places",
-                params={
-                    "categories": "healthcare.hospital",
-                    "filter": f"circle:{lon},{lat},35000",  # lon,lat
-                    "limit": 10,
-                    "apiKey": api_key,
-                },
-                timeout=20
-            )
-            return r.json() if r.ok else None
-        except Exception:
-            return None
-
-    @st.cache_data(ttl=3600)
-    def get_route_distance_km(start_lat, start_lon, end_lat, end_lon, api_key: str):
-        """Driving distance in km using Geoapify routing (NOTE: waypoints are lon,lat)."""
-        try:
-            r = requests.get(
-                "https://api.geoapify.com/v1/routing",
-                params={
-                    "waypoints": f"{start_lon},{start_lat}|{end_lon},{end_lat}",
-                    "mode": "drive",
-                    "details": "route_details",
-                    "apiKey": api_key,
-                },
-                timeout=20
-            )
-            if r.ok:
-                data = r.json()
-                if data.get("features"):
-                    return data["features"][0]["properties"]["distance"] / 1000
-        except Exception:
-            pass
-        return None
-
-    def haversine_km(lat1, lon1, lat2, lon2):
-        R = 6371.0
-        dlat = radians(lat2 - lat1)
-        dlon = radians(lon2 - lon1)
-        a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
-        return 2 * R * asin(sqrt(a))
-
     if 'search_clicked' not in st.session_state:
         st.session_state.search_clicked = False
 
     if search_clicked and location_input:
         st.session_state.search_clicked = True
         with st.spinner("Locating and searching hospitals..."):
-            lat, lon = geocode_address(location_input.strip(), GEOAPIFY_KEY)
+            lat, lon, hospitals, place, fallback_from = search_hospitals(location_input.strip(), cfg.geoapify_key)
             if lat and lon:
-                hospitals = find_nearby_hospitals(lat, lon, GEOAPIFY_KEY)
+                if fallback_from:
+                    # Distances below are measured from this other place, so say so
+                    st.info(f"No hospitals found near **{fallback_from}**. "
+                            f"Showing results near **{place}** instead.")
                 if hospitals and hospitals.get("features"):
-                    data_rows = []
-                    for hospital in hospitals["features"]:
-                        props = hospital.get("properties", {})
-                        name = props.get("name", "Unknown")
-                        address = props.get("formatted", "No address available")
-                        h_lat, h_lon = props.get("lat"), props.get("lon")
-                        # Fast approximate distance for all results
-                        approx_km = haversine_km(lat, lon, h_lat, h_lon) if (h_lat and h_lon) else None
-                        data_rows.append({
-                            "Name": name,
-                            "Address": address,
-                            "Approx. Distance (km)": round(approx_km, 2) if approx_km is not None else "N/A",
-                            "Coordinates": f"({h_lat}, {h_lon})",
-                            "lat": h_lat,
-                            "lon": h_lon
-                        })
-
-                    df = pd.DataFrame(data_rows)
+                    # Imported here so page loads without a hospital search skip them
+                    import numpy as np
+                    import pandas as pd
+
+                    feats = hospitals["features"]
+                    props = [f.get("properties", {}) for f in feats]
+                    lats = np.fromiter((p.get("lat") if p.get("lat") is not None else np.nan for p in props),
+                                       dtype=np.float64, count=len(props))
+                    lons = np.fromiter((p.get("lon") if p.get("lon") is not None else np.nan for p in props),
+                                       dtype=np.float64, count=len(props))
+                    # Fast approximate (haversine) distance for all results in one vector op
+                    dlat = np.radians(lats - lat)
+                    dlon = np.radians(lons - lon)
+                    a = np.sin(dlat / 2) ** 2 + np.cos(np.radians(lat)) * np.cos(np.radians(lats)) * np.sin(dlon / 2) ** 2
+                    dist = 2 * 6371.0 * np.arcsin(np.sqrt(a))
+
+                    df = pd.DataFrame({
+                        "Name": [p.get("name") or "Unknown" for p in props],
+                        "Address": [p.get("formatted") or "No address available" for p in props],
+                        "dist_km": dist,
+                        "Coordinates": [f"({p.get('lat')}, {p.get('lon')})" for p in props],
+                        "lat": lats,
+                        "lon": lons,
+                    })
+                    # Numeric dist_km is used for sorting; this string column is for display only
+                    df["Approx. Distance (km)"] = df["dist_km"].map(lambda x: f"{x:.2f}" if pd.notna(x) else "N/A")
                     st.subheader("Results")
                     st.dataframe(df[["Name", "Address", "Approx. Distance (km)", "Coordinates"]], use_container_width=True)
 
-                    # Optional: On-demand driving distance to save quota/time
-                    with st.expander("Compute driving distances (slower; uses extra API calls)"):
-                        top_n = st.slider("Compute for top N by approximate distance:", min_value=1, max_value=min(10, len(df)), value=5)
-                        if st.button("Calculate driving distances"):
-                            with st.spinner("Calculating driving distances..."):
-                                df_sorted = df.sort_values(by="Approx. Distance (km)", key=lambda s: pd.to_numeric(s, errors="coerce"))
-                                subset = df_sorted.head(top_n).copy()
-                                dists = []
-                                for _, row in subset.iterrows():
-                                    d = get_route_distance_km(lat, lon, float(row["lat"]), float(row["lon"]), GEOAPIFY_KEY)
-                                    dists.append(round(d, 2) if d is not None else None)
-                                subset["Driving Distance (km)"] = dists
-                                st.dataframe(subset[["Name", "Address", "Approx. Distance (km)", "Driving Distance (km)", "Coordinates"]],
-                                             use_container_width=True)
+                    # Optional: On-demand driving distance to save quota/time.
+                    # Hospitals without coordinates can't be routed, so they are never offered.
+                    routable = df.dropna(subset=["dist_km"])
+                    if not routable.empty:
+                        with st.expander("Compute driving distances (slower; uses extra API calls)"):
+                            max_n = min(HOSPITAL_RESULT_LIMIT, len(routable))
+                            top_n = (st.slider("Compute for top N by approximate distance:", min_value=1,
+                                               max_value=max_n, value=min(5, max_n))
+                                     if max_n > 1 else 1)
+                            if st.button("Calculate driving distances"):
+                                with st.spinner("Calculating driving distances..."):
+                                    subset = routable.nsmallest(top_n, "dist_km").copy()
+                                    # Routing calls are independent network I/O: run them concurrently
+                                    with ThreadPoolExecutor(max_workers=8) as ex:
+                                        results = list(ex.map(
+                                            lambda h_lat, h_lon: get_route_distance_km(lat, lon, h_lat, h_lon, cfg.geoapify_key),
+                                            subset["lat"], subset["lon"],
+                                        ))
+                                    subset["Driving Distance (km)"] = [round(d, 2) if d is not None else None for d in results]
+                                    st.dataframe(subset[["Name", "Address", "Approx. Distance (km)", "Driving Distance (km)", "Coordinates"]],
+                                                 use_container_width=True)
                 else:
                     st.warning("⚠️ No hospitals found or API returned no features.")
             else:
@@ -0,0 +1,78 @@
+# themes.py — colour themes and the HTML/CSS built from them.
+# Imported (not defined in streamlit_app.py) so the strings below are built once
+# per process: the app script is re-executed on every rerun, imported modules are not.
+
+THEMES = {
+    "dark": {
+        "bg_color": "#121212",
+        "text_color": "#FFFFFF",
+        "header_color": "#5B0C86",
+        "card_color": "#1e1e26",
+        "result_color": "#2A2A2D",
+        "button_color": "#ffffff",
+        "button_text": "#6a1b9a",
+        "shadow": "0 4px 6px rgba(0, 0, 0, 0.1)",
+    },
+    "light": {
+        "bg_color": "#f5f5f5",
+        "text_color": "#000000",
+        "header_color": "#e1bee7",
+        "card_color": "#ffffff",
+        "result_color": "#f7eeee",
+        "button_color": "#ce93d8",
+        "button_text": "#000000",
+        "shadow": "0 4px 6px rgba(0, 0, 0, 0.1)",
+    },
+}
+
+HEADER_HTML = """
+    <div class="custom-header">
+        <div class="custom-header-title">🩺 HealthCare AI Assistant</div>
+    </div>
+"""
+
+def _theme_css(theme: str) -> str:
+    c = THEMES[theme]
+    return f"""
+    <style>
+        html, body, [data-testid="stAppViewContainer"], .main, .block-container {{
+            background-color: {c["bg_color"]} !important;
+            color: {c["text_color"]} !important;
+        }}
+        .block-container {{ padding-top: 6rem !important; }}
+        #MainMenu, footer, header {{ visibility: hidden; }}
+        .custom-header {{
+            position: fixed; top: 0; left: 0; right: 0; height: 60px;
+            background-color: {c["header_color"]}; color: {c["text_color"]};
+            padding: 0 2rem; z-index: 9999;
+            display: flex; align-items: center; justify-content: space-between;
+        }}
+        .custom-header-title {{ font-size: 1.4rem; font-weight: bold; }}
+        .stButton>button, .stDownloadButton>button {{
+            background-color: {c["button_color"]} !important;
+            color: {c["button_text"]} !important;
+            font-weight: bold; border: none; padding: 8px 16px;
+            border-radius: 6px; box-shadow: {c["shadow"]};
+            transition: all 0.3s ease-in-out;
+        }}
+        .stButton>button:hover, .stDownloadButton>button:hover {{
+            transform: scale(1.05);
+            box-shadow: 0 6px 12px rgba(0, 0, 0, 0.25);
+        }}
+        .result-container {{
+            background-color: {c["result_color"]};
+            padding: 15px; border-radius: 10px; margin-top: 10px;
+            box-shadow: 0px 4px 16px rgba(0, 0, 0, 0.2);
+            word-wrap: break-word; white-space: pre-wrap;
+        }}
+    </style>
+"""
+
+def _card_open_html(theme: str, padding: str, radius: str, extra: str = "") -> str:
+    c = THEMES[theme]
+    return (f"<div style='background-color:{c['card_color']}; color:{c['text_color']}; "
+            f"padding:{padding}; border-radius:{radius};{extra}'>")
+
+CSS = {t: _theme_css(t) for t in THEMES}
+MAIN_CARD_HTML = {t: _card_open_html(t, "2rem", "20px") for t in THEMES}
+FINDER_CARD_HTML = {t: _card_open_html(t, "1.5rem", "15px", " margin-top:30px;") for t in THEMES}